@@ -1,14 +1,19 @@
 import os
+import io
 import logging
 import uuid
+import threading
 from flask import Flask, render_template, request, jsonify, session
-import redis
-from werkzeug.utils import secure_filename
+from redis.exceptions import ConnectionError as RedisConnectionError
 from rag_utils import (
     process_pdf, 
     store_document_embeddings, 
     query_document, 
-    get_redis_connection
+    get_redis_connection,
+    document_digest,
+    status_key,
+    get_document_status,
+    claim_ingest
 )
 
 # Configure logging
@@ -19,19 +24,12 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 
-# Check if essential libraries are available
-missing_libs = []
-try:
-    import PyPDF2
-except ImportError:
-    missing_libs.append("PyPDF2")
-
 # Initialize Redis connection
 try:
     redis_client = get_redis_connection()
     redis_client.ping()  # Test connection
     logger.info("Redis connection successful")
-except redis.ConnectionError as e:
+except RedisConnectionError as e:
     logger.error(f"Redis connection failed: {e}")
     redis_client = None
 except Exception as e:
@@ -40,14 +38,28 @@ except Exception as e:
 
 # File upload configuration
 ALLOWED_EXTENSIONS = {'pdf'}
-UPLOAD_FOLDER = '/tmp'  # Temporary storage for uploads
-
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def ingest_document(doc_id, buf):
+    """Extract, embed and store a PDF, recording progress in Redis"""
+    try:
+        chunks = process_pdf(buf)
+        if not chunks:
+            logger.error(f"Failed to extract text from PDF for document {doc_id}")
+            redis_client.set(status_key(doc_id), "failed")
+            return
+        
+        # Store chunks and their embeddings in Redis (marks the document ready)
+        if not store_document_embeddings(redis_client, doc_id, chunks):
+            redis_client.set(status_key(doc_id), "failed")
+    
+    except Exception as e:
+        logger.error(f"Error ingesting document {doc_id}: {str(e)}")
+        redis_client.set(status_key(doc_id), "failed")
+
 @app.route('/')
 def index():
     """Render the main page"""
@@ -71,38 +83,54 @@ def upload_file():
         return jsonify({'error': 'File type not allowed. Please upload a PDF.'}), 400
     
     try:
-        # Save the file temporarily
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        # Generate a document ID for this upload
-        doc_id = f"{session['session_id']}_{filename}"
+        # Read straight from Werkzeug's upload stream (already buffered in
+        # memory for small files) rather than round-tripping through disk
+        data = file.stream.read()
         
-        # Process the PDF and store in Redis
-        chunks = process_pdf(file_path)
-        if not chunks:
-            return jsonify({'error': 'Failed to extract text from PDF'}), 400
+        # Identical PDFs share a document ID, so re-uploads skip re-indexing
+        doc_id = document_digest(data)
         
-        # Store chunks and their embeddings in Redis
-        store_document_embeddings(redis_client, doc_id, chunks)
+        # Claim the ingest atomically, so double submits and retries of a
+        # document that is already in flight don't start a second thread
+        status = claim_ingest(redis_client, doc_id)
         
         # Save document ID in session for later retrieval
         session['current_doc_id'] = doc_id
         
-        # Clean up the temporary file
-        os.remove(file_path)
+        if status == 'ready':
+            return jsonify({
+                'success': True,
+                'message': 'Document processed successfully!',
+                'doc_id': doc_id,
+                'status': 'ready',
+                'cached': True
+            })
+        
+        if status is None:
+            # Process the PDF and store in Redis in the background
+            buf = io.BytesIO(data)
+            threading.Thread(target=ingest_document, args=(doc_id, buf), daemon=True).start()
         
         return jsonify({
             'success': True, 
-            'message': 'Document processed successfully!',
-            'doc_id': doc_id
-        })
+            'message': 'Document is being processed.',
+            'doc_id': doc_id,
+            'status': 'processing'
+        }), 202
     
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}")
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
+@app.route('/status/<doc_id>')
+def document_status(doc_id):
+    """Report the ingestion status of an uploaded document"""
+    status = get_document_status(redis_client, doc_id)
+    if status is None:
+        return jsonify({'error': 'Unknown document'}), 404
+    
+    return jsonify({'doc_id': doc_id, 'status': status})
+
 @app.route('/query', methods=['POST'])
 def query():
     """Handle user query"""
@@ -120,8 +148,15 @@ def query():
         return jsonify({'answer': 'Chat session ended. You may upload a new document or ask new questions.'})
     
     try:
+        doc_id = session['current_doc_id']
+        
+        # Refuse to query until background ingestion has finished
+        status = get_document_status(redis_client, doc_id) or 'failed'
+        if status != 'ready':
+            return jsonify({'error': f'Document is not ready (status: {status})', 'status': status}), 409
+        
         # Get answer from RAG system
-        answer = query_document(redis_client, session['current_doc_id'], user_query)
+        answer = query_document(redis_client, doc_id, user_query)
         return jsonify({'answer': answer})
     
     except Exception as e:
@@ -0,0 +1,48 @@
+import re
+from typing import List
+
+# Whitespace following sentence-ending punctuation
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Split cleaned text into overlapping chunks
+def fast_chunk(text: str, size: int, overlap: int) -> List[str]:
+    """
+    Greedily pack whole sentences into chunks of at most `size` characters
+    
+    Works purely on offsets into `text`: each chunk is sliced out once,
+    and the next one starts up to `overlap` characters before the previous
+    end (less if the pending sentence wouldn't fit otherwise). Sentences
+    longer than `size` are hard-split.
+    
+    Args:
+        text: Whitespace-normalized text
+        size: Maximum chunk length
+        overlap: Characters shared between consecutive chunks
+        
+    Returns:
+        List of text chunks
+    """
+    boundaries = [m.start() for m in _SENTENCE_END.finditer(text)]
+    boundaries.append(len(text))
+    
+    chunks = []
+    start = 0    # Start of the current chunk
+    end = 0      # End of the last sentence packed into it
+    emitted = 0  # Text before this offset is already in a chunk
+    for boundary in boundaries:
+        # Next sentence doesn't fit: emit what we have and carry as much of
+        # the overlap as still leaves room for the pending sentence
+        if boundary - start > size and end > emitted:
+            chunks.append(text[start:end].strip())
+            emitted = end
+            start = min(end, max(end - overlap, boundary - size))
+        end = boundary
+        
+        while end - start > size:
+            chunks.append(text[start:start + size].strip())
+            emitted = start + size
+            start = emitted - overlap
+    
+    if end > emitted:
+        chunks.append(text[start:end].strip())
+    return chunks
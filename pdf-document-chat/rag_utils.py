@@ -2,45 +2,45 @@ import os
 import logging
 import re
 import io
+import hashlib
+import multiprocessing
+from functools import lru_cache
 import redis
-from typing import List, Dict, Any, Union
-import PyPDF2
+import numpy as np
+import msgpack
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Union
+from redis.commands.search.field import VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+import pypdfium2 as pdfium
+import onnxruntime as ort
+from transformers import AutoTokenizer
+from chunking import fast_chunk
+from huggingface_hub import snapshot_download
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Redis as RedisVectorStore
 from langchain_groq import ChatGroq
-from langchain_community.embeddings.fake import FakeEmbeddings
-from langchain.schema.runnable import RunnablePassthrough
+from langchain.schema.embeddings import Embeddings
+from langchain.schema import Document
 from langchain.prompts import ChatPromptTemplate
+from langchain.schema.output_parser import StrOutputParser
+from langchain.schema.runnable import RunnableLambda
 
-# Handle different LangChain versions
+# Bind the stuff-documents chain factory once, at import. Early releases in the
+# pinned langchain range (0.0.335-0.0.34x) lack create_stuff_documents_chain,
+# so build the equivalent runnable there.
+# Either way the chain is a runnable returning a string, so queries take a
+# single code path.
 try:
-    # For newer versions of LangChain
-    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain as _STUFF_CHAIN_FACTORY
 except ImportError:
-    # For older versions of LangChain
-    try:
-        from langchain.chains import create_stuff_documents_chain
-    except ImportError:
-        # If still not found, implement our own version
-        def create_stuff_documents_chain(llm, prompt):
-            def chain(inputs):
-                # Get the context and question from the inputs
-                context = inputs.get("context", [])
-                question = inputs.get("question", "")
-                
-                # Join the document texts with newlines
-                context_text = "\n\n".join([doc.page_content if hasattr(doc, "page_content") else str(doc) for doc in context])
-                
-                # Format the prompt template
-                formatted_prompt = prompt.format(context=context_text, question=question)
-                
-                # Call the LLM
-                response = llm.invoke(formatted_prompt)
-                
-                # Return the response
-                return response
-                
-            return chain
+    def _format_stuff_inputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Join the document texts with newlines
+        context = "\n\n".join(doc.page_content for doc in inputs["context"])
+        return {"context": context, "question": inputs["question"]}
+    
+    def _STUFF_CHAIN_FACTORY(llm, prompt):
+        return RunnableLambda(_format_stuff_inputs) | prompt | llm | StrOutputParser()
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -50,25 +50,174 @@ logger = logging.getLogger(__name__)
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+# PDFs with fewer pages than this are extracted in-process to avoid the
+# fork and serialization cost of the process pool. A thread pool is not an
+# option: PDFium is not thread-safe, so pages can't be extracted concurrently
+# from one process.
+PARALLEL_MIN_PAGES = int(os.environ.get("PARALLEL_MIN_PAGES", 16))
+MAX_EXTRACT_WORKERS = min(os.cpu_count() or 1, 4)
+# Extraction runs on background threads next to Flask's and ONNX Runtime's
+# thread pools, where fork() can deadlock the children. Start workers from a
+# single-threaded forkserver (spawn where that's unavailable) instead, with
+# this module preloaded so each worker doesn't re-import it.
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _MP_CONTEXT = multiprocessing.get_context("forkserver")
+    _MP_CONTEXT.set_forkserver_preload([__name__])
+else:
+    _MP_CONTEXT = multiprocessing.get_context("spawn")
+# Number of chunks written per Redis pipeline round trip
+REDIS_BATCH_SIZE = 500
+# Vectors are stored and queried as fp16 (needs Redis 7.4+ / RediSearch 2.10+)
+VECTOR_DTYPE = np.float16
+VECTOR_INDEX_TYPE = "FLOAT16"
+# HNSW graph parameters: links per node, build-time and query-time candidate lists
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_RUNTIME = 50
+# A 'processing' claim expires after this long, so a crashed ingest doesn't
+# block the document forever
+INGEST_CLAIM_TTL_SECONDS = 15 * 60
+# Number of chunks retrieved per query
+RETRIEVAL_K = 5
+# Collapses runs of whitespace in extracted text
+_WS = re.compile(r'\s+')
+# Split with the sentence-packing fast_chunk instead of LangChain's splitter
+USE_FAST_CHUNKER = os.environ.get("USE_FAST_CHUNKER", "true").lower() == "true"
 # Use local Redis as default
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
+REDIS_MAX_CONNECTIONS = 32
 EMBEDDINGS_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Directory holding the ONNX export of EMBEDDINGS_MODEL (see README). When it
+# is missing, the ONNX export published in the model's hub repo is downloaded.
+EMBEDDINGS_ONNX_PATH = os.environ.get(
+    "EMBEDDINGS_ONNX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "minilm-onnx")
+)
+# Files needed from the hub repo: tokenizer plus the published ONNX export
+EMBEDDINGS_HUB_FILES = [
+    "config.json",
+    "tokenizer.json",
+    "tokenizer_config.json",
+    "special_tokens_map.json",
+    "vocab.txt",
+    "onnx/model.onnx",
+]
+EMBEDDINGS_DIM = 384
+EMBEDDINGS_MAX_TOKENS = 256
+# Texts per ONNX forward pass
+EMBEDDINGS_BATCH_SIZE = 64
 LLM_MODEL = "llama-3.3-70b-versatile"
 
+# Prompt used to answer questions from retrieved document sections
+PROMPT_TEMPLATE = """You are a helpful assistant that answers questions based on the provided document sections and related information.
+
+Context information is below.
+---------------------
+{context}
+---------------------
+
+Given the context information, provide a helpful and informative answer to the query. 
+If the exact answer is not in the provided context, you can:
+1. Provide related information from the context
+2. Make reasonable inferences based on the context
+3. Explain concepts that are related to the query
+4. If completely unrelated, say "This question doesn't seem to be directly related to the document content."
+
+Try to be helpful while staying within the general scope of the document's subject matter.
+
+Query: {question}
+
+Answer: """
+_PROMPT = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+# MiniLM sentence encoder running on ONNX Runtime
+class MiniLMEmbeddings(Embeddings):
+    """
+    Mean-pooled, L2-normalized MiniLM sentence embeddings
+    
+    Loads the int8-quantized model (model_quantized.onnx) when present,
+    otherwise the full-precision export (model.onnx). If the local export
+    directory doesn't exist, the ONNX export from EMBEDDINGS_MODEL's hub
+    repo is downloaded (and cached) instead.
+    """
+    
+    def __init__(self, model_dir: str = EMBEDDINGS_ONNX_PATH):
+        if not os.path.isdir(model_dir):
+            logger.info(f"{model_dir} not found, downloading ONNX export of {EMBEDDINGS_MODEL}")
+            model_dir = snapshot_download(EMBEDDINGS_MODEL, allow_patterns=EMBEDDINGS_HUB_FILES)
+        
+        candidates = ["model_quantized.onnx", "model.onnx", os.path.join("onnx", "model.onnx")]
+        model_file = next(
+            (path for path in (os.path.join(model_dir, c) for c in candidates) if os.path.exists(path)),
+            None
+        )
+        if model_file is None:
+            raise FileNotFoundError(f"No ONNX model found in {model_dir}")
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Run one forward pass over a batch padded to its longest text"""
+        inputs = self.tokenizer(
+            texts,
+            padding="longest",
+            truncation=True,
+            max_length=EMBEDDINGS_MAX_TOKENS,
+            return_tensors="np"
+        )
+        feed = {k: v.astype(np.int64) for k, v in inputs.items() if k in self.input_names}
+        token_embeddings = self.session.run(None, feed)[0]
+        
+        # Mean pool over non-padding tokens, then L2 normalize
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts into a (len(texts), EMBEDDINGS_DIM) float32 array
+        
+        Texts are run through the model EMBEDDINGS_BATCH_SIZE at a time,
+        so N texts cost ceil(N / EMBEDDINGS_BATCH_SIZE) forward passes.
+        
+        Args:
+            texts: Texts to encode
+            
+        Returns:
+            Normalized embeddings
+        """
+        if not texts:
+            return np.empty((0, EMBEDDINGS_DIM), dtype=np.float32)
+        
+        return np.concatenate([
+            self._encode_batch(texts[i:i + EMBEDDINGS_BATCH_SIZE])
+            for i in range(0, len(texts), EMBEDDINGS_BATCH_SIZE)
+        ])
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
 # Initialize embedding model
+@lru_cache(maxsize=1)
 def get_embeddings_model():
     """Get the embeddings model"""
     try:
-        # Using FakeEmbeddings as a fallback since sentence-transformers is not available
-        # In production, this should be replaced with proper embeddings
-        return FakeEmbeddings(size=1536)  # Using 1536 dimensions which is common
+        return MiniLMEmbeddings()
     except Exception as e:
         logger.error(f"Error initializing embeddings model: {e}")
         raise
 
 # Initialize LLM
+@lru_cache(maxsize=1)
 def get_llm():
     """Get the Groq LLM model"""
     if not GROQ_API_KEY:
@@ -83,55 +232,107 @@ def get_llm():
         logger.error(f"Error initializing Groq LLM: {e}")
         raise
 
+# Redis connection pool shared by every client in the process
+_POOL = redis.ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    password=REDIS_PASSWORD if REDIS_PASSWORD else None,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    decode_responses=False  # Keep binary data as is
+)
+
 # Redis connection
 def get_redis_connection():
-    """Get Redis connection"""
+    """Get a Redis client backed by the shared connection pool"""
     try:
-        return redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            password=REDIS_PASSWORD if REDIS_PASSWORD else None,
-            decode_responses=False  # Keep binary data as is
-        )
+        return redis.Redis(connection_pool=_POOL)
     except Exception as e:
         logger.error(f"Error connecting to Redis: {e}")
         raise
 
+# PDF opened once per extraction worker process
+_WORKER_PDF = None
+
+def _init_extract_worker(source) -> None:
+    """
+    Open the PDF once in each worker process
+    
+    PDFium handles cannot be pickled, so every worker opens its own
+    document from the path or raw bytes passed in at startup.
+    
+    Args:
+        source: Path to the PDF file or its raw bytes
+    """
+    global _WORKER_PDF
+    _WORKER_PDF = pdfium.PdfDocument(source)
+
+def _extract_page(page_index: int) -> str:
+    """
+    Extract the text of one page of the worker's PDF
+    
+    Args:
+        page_index: Zero-based page number
+        
+    Returns:
+        Page text
+    """
+    return _WORKER_PDF[page_index].get_textpage().get_text_bounded()
+
 # Process PDF and extract text
-def process_pdf(file_path: str) -> List[str]:
+def process_pdf(source: Union[str, bytes, io.BytesIO]) -> List[str]:
     """
     Extract text from PDF and split into chunks
     
     Args:
-        file_path: Path to the PDF file
+        source: Path to the PDF file, its raw bytes, or a file-like object
         
     Returns:
         List of text chunks
     """
     try:
+        # Read file-like objects into bytes so they can be shared with workers
+        if hasattr(source, "read"):
+            source = source.read()
+        
         # Extract text from PDF
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
+        pdf = pdfium.PdfDocument(source)
+        try:
+            n_pages = len(pdf)
+            use_pool = n_pages >= PARALLEL_MIN_PAGES and MAX_EXTRACT_WORKERS > 1
+            if not use_pool:
+                parts = [pdf[i].get_textpage().get_text_bounded() for i in range(n_pages)]
+        finally:
+            pdf.close()
+        
+        if use_pool:
+            # Page extraction is CPU-bound and PDFium is single-threaded,
+            # so fan out across processes
+            with ProcessPoolExecutor(
+                max_workers=MAX_EXTRACT_WORKERS,
+                mp_context=_MP_CONTEXT,
+                initializer=_init_extract_worker,
+                initargs=(source,)
+            ) as executor:
+                parts = list(executor.map(_extract_page, range(n_pages), chunksize=4))
+        text = "\n\n".join(parts)
         
         # Clean text
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WS.sub(' ', text).strip()
         
         if not text:
-            logger.warning(f"No text extracted from {file_path}")
+            logger.warning("No text extracted from PDF")
             return []
         
         # Split text into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            length_function=len,
-        )
-        
-        chunks = text_splitter.split_text(text)
+        if USE_FAST_CHUNKER:
+            chunks = fast_chunk(text, CHUNK_SIZE, CHUNK_OVERLAP)
+        else:
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP,
+                length_function=len,
+            )
+            chunks = text_splitter.split_text(text)
         logger.info(f"Extracted {len(chunks)} chunks from PDF")
         
         return chunks
@@ -140,6 +341,113 @@ def process_pdf(file_path: str) -> List[str]:
         logger.error(f"Error processing PDF: {e}")
         return []
 
+# Create the RediSearch vector index for a document
+def create_vector_index(redis_client, doc_id: str, dim: int) -> None:
+    """
+    Create an HNSW vector index over the document's chunk hashes
+    
+    Only the vectors are indexed; chunk texts live in a single packed
+    blob, addressed by each hash's offset/length (see store_document_embeddings).
+    
+    Args:
+        redis_client: Redis client
+        doc_id: Document ID (also used as the index name)
+        dim: Embedding dimension
+    """
+    index = redis_client.ft(doc_id)
+    try:
+        index.info()
+        return  # Index already exists
+    except redis.exceptions.ResponseError:
+        pass
+    
+    try:
+        index.create_index(
+            fields=[
+                VectorField("content_vector", "HNSW", {
+                    "TYPE": VECTOR_INDEX_TYPE,
+                    "DIM": dim,
+                    "DISTANCE_METRIC": "COSINE",
+                    "M": HNSW_M,
+                    "EF_CONSTRUCTION": HNSW_EF_CONSTRUCTION,
+                }),
+            ],
+            definition=IndexDefinition(prefix=[f"{doc_id}:"], index_type=IndexType.HASH)
+        )
+    except redis.exceptions.ResponseError as e:
+        # Older servers reject TYPE FLOAT16 (or lack FT.CREATE entirely)
+        logger.error(
+            f"Redis could not create the {VECTOR_INDEX_TYPE} vector index for {doc_id}: {e}. "
+            f"{VECTOR_INDEX_TYPE} vectors need RediSearch 2.10+ (Redis Stack 7.4+)."
+        )
+        raise
+
+# Content-addressed document ID
+def document_digest(data: bytes) -> str:
+    """Hash PDF bytes so identical uploads map to the same document ID"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Redis key holding a document's ingestion state
+def status_key(doc_id: str) -> str:
+    """Key holding 'processing', 'ready' or 'failed' for a document"""
+    return f"status:{doc_id}"
+
+# Ingestion state of a document
+def get_document_status(redis_client, doc_id: str) -> Optional[str]:
+    """Get 'processing', 'ready' or 'failed', or None for an unknown document"""
+    status = redis_client.get(status_key(doc_id))
+    return status.decode() if status is not None else None
+
+# Atomically move a document to 'processing' unless it is processing or ready
+_CLAIM_INGEST = """
+local status = redis.call('GET', KEYS[1])
+if status == 'processing' or status == 'ready' then
+    return status
+end
+redis.call('SET', KEYS[1], 'processing', 'EX', ARGV[1])
+return false
+"""
+
+# Claim a document for ingestion
+def claim_ingest(redis_client, doc_id: str) -> Optional[str]:
+    """
+    Mark a document as 'processing' unless another ingest owns it
+    
+    Args:
+        redis_client: Redis client
+        doc_id: Document ID
+        
+    Returns:
+        None if the caller now owns the ingest, otherwise the current
+        status ('processing' or 'ready')
+    """
+    status = redis_client.eval(_CLAIM_INGEST, 1, status_key(doc_id), INGEST_CLAIM_TTL_SECONDS)
+    return status.decode() if status is not None else None
+
+# Redis key for a document's packed chunk texts
+def blob_key(doc_id: str) -> str:
+    """Key of the blob of concatenated msgpack-encoded chunk texts"""
+    return f"{doc_id}:blob"
+
+# Remove everything stored for a document
+def drop_document(redis_client, doc_id: str) -> None:
+    """
+    Drop the document's index along with its chunk hashes and blob
+    
+    The status is reset to 'processing' first, so queries are refused
+    while the document is missing.
+    
+    Args:
+        redis_client: Redis client
+        doc_id: Document ID
+    """
+    redis_client.set(status_key(doc_id), "processing", ex=INGEST_CLAIM_TTL_SECONDS)
+    try:
+        redis_client.ft(doc_id).dropindex(delete_documents=True)
+    except redis.exceptions.ResponseError:
+        pass  # No index yet
+    redis_client.delete(blob_key(doc_id))
+
 # Store document embeddings in Redis
 def store_document_embeddings(redis_client, doc_id: str, chunks: List[str]) -> bool:
     """
@@ -154,15 +462,42 @@ def store_document_embeddings(redis_client, doc_id: str, chunks: List[str]) -> b
         Success status
     """
     try:
+        if not chunks:
+            return False
+        
+        # Each chunk is msgpack-encoded separately and the encodings are
+        # concatenated, so a chunk can be read back with one GETRANGE
+        packed = [msgpack.packb(chunk, use_bin_type=True) for chunk in chunks]
+        offsets = np.cumsum([0] + [len(p) for p in packed]).tolist()
+        
+        # Clear any partial or differently chunked earlier ingest, so no
+        # stale chunk hashes stay in the index
+        drop_document(redis_client, doc_id)
+        
         embeddings = get_embeddings_model()
+        pipe = redis_client.pipeline(transaction=False)
         
-        # Create a vector store with the chunks
-        vector_store = RedisVectorStore.from_texts(
-            texts=chunks,
-            embedding=embeddings,
-            redis_url=f"redis://{':' + REDIS_PASSWORD + '@' if REDIS_PASSWORD else ''}{REDIS_HOST}:{REDIS_PORT}",
-            index_name=doc_id
-        )
+        # Embed and write one batch at a time so only a batch of vectors
+        # is held in memory, with one pipeline round trip per batch
+        for batch_start in range(0, len(chunks), REDIS_BATCH_SIZE):
+            batch = chunks[batch_start:batch_start + REDIS_BATCH_SIZE]
+            vectors = np.asarray(embeddings.embed_documents(batch), dtype=VECTOR_DTYPE)
+            
+            if batch_start == 0:
+                create_vector_index(redis_client, doc_id, vectors.shape[1])
+            
+            for i, vector in enumerate(vectors, start=batch_start):
+                pipe.hset(f"{doc_id}:{i}", mapping={
+                    "chunk_id": i,
+                    "offset": offsets[i],
+                    "length": offsets[i + 1] - offsets[i],
+                    "content_vector": vector.tobytes(),
+                })
+            pipe.execute()
+        
+        # Chunk texts are packed into one value instead of one field per hash
+        redis_client.set(blob_key(doc_id), b"".join(packed))
+        redis_client.set(status_key(doc_id), "ready")
         
         logger.info(f"Stored {len(chunks)} chunks with embeddings for document {doc_id}")
         return True
@@ -171,82 +506,65 @@ def store_document_embeddings(redis_client, doc_id: str, chunks: List[str]) -> b
         logger.error(f"Error storing document embeddings: {e}")
         return False
 
+# Build the document chain
+@lru_cache(maxsize=1)
+def get_document_chain():
+    """Get the document chain, built on first use and reused afterwards"""
+    return _STUFF_CHAIN_FACTORY(get_llm(), _PROMPT)
+
+# Retrieve the most relevant chunks for a query embedding
+def search_document(redis_client, doc_id: str, query_vector: List[float], k: int = RETRIEVAL_K) -> List[Document]:
+    """
+    Run a KNN search over the document's vector index
+    
+    Args:
+        redis_client: Redis client
+        doc_id: Document ID
+        query_vector: Embedding of the user query
+        k: Number of chunks to return
+        
+    Returns:
+        Matching chunks, closest first
+    """
+    # Encode the query in the same dtype as the stored vectors
+    query_bytes = np.asarray(query_vector, dtype=VECTOR_DTYPE).tobytes()
+    
+    knn_query = (
+        Query(f"*=>[KNN {k} @content_vector $vec EF_RUNTIME {HNSW_EF_RUNTIME} AS score]")
+        .sort_by("score")
+        .return_fields("chunk_id", "offset", "length", "score")
+        .paging(0, k)
+        .dialect(2)
+    )
+    results = redis_client.ft(doc_id).search(knn_query, query_params={"vec": query_bytes})
+    
+    # Fetch only the hits' byte ranges of the text blob, in one round trip
+    pipe = redis_client.pipeline(transaction=False)
+    for doc in results.docs:
+        offset = int(doc.offset)
+        pipe.getrange(blob_key(doc_id), offset, offset + int(doc.length) - 1)
+    texts = [msgpack.unpackb(packed, raw=False) for packed in pipe.execute()]
+    
+    return [
+        Document(
+            page_content=text,
+            metadata={"chunk_id": int(doc.chunk_id), "score": float(doc.score)}
+        )
+        for doc, text in zip(results.docs, texts)
+    ]
+
 # Query document using RAG
 def query_document(redis_client, doc_id: str, query: str) -> str:
     """
     Query the document using RAG
     """
     try:
-        # Initialize models
-        embeddings = get_embeddings_model()
-        llm = get_llm()
-        
-        # Create vector store
-        vector_store = RedisVectorStore(
-            redis_url=f"redis://{':' + REDIS_PASSWORD + '@' if REDIS_PASSWORD else ''}{REDIS_HOST}:{REDIS_PORT}",
-            index_name=doc_id,
-            embedding=embeddings
-        )
-        
-        # Create retriever
-        retriever = vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5}  # Retrieve top 5 most relevant chunks
-        )
-        
-        # Create more flexible prompt
-        prompt_template = """You are a helpful assistant that answers questions based on the provided document sections and related information.
-
-Context information is below.
----------------------
-{context}
----------------------
-
-Given the context information, provide a helpful and informative answer to the query. 
-If the exact answer is not in the provided context, you can:
-1. Provide related information from the context
-2. Make reasonable inferences based on the context
-3. Explain concepts that are related to the query
-4. If completely unrelated, say "This question doesn't seem to be directly related to the document content."
-
-Try to be helpful while staying within the general scope of the document's subject matter.
-
-Query: {question}
-
-Answer: """
-
-        prompt = ChatPromptTemplate.from_template(prompt_template)
-        
-        # Create document chain
-        document_chain = create_stuff_documents_chain(llm, prompt)
-        
-        # Create RAG chain
-        try:
-            # Modern LangChain syntax
-            rag_chain = (
-                {"context": retriever, "question": RunnablePassthrough()}
-                | document_chain
-            )
-        except (TypeError, ValueError):
-            # Fallback for older LangChain versions
-            def rag_chain(query):
-                # Get documents from retriever
-                docs = retriever.get_relevant_documents(query)
-                # Pass to document chain
-                return document_chain({"context": docs, "question": query})
+        # Embed the query once and retrieve the matching chunks
+        query_vector = get_embeddings_model().embed_query(query)
+        docs = search_document(redis_client, doc_id, query_vector)
         
         # Get response
-        try:
-            # For newer versions of LangChain
-            response = rag_chain.invoke(query)
-        except AttributeError:
-            # For older versions or our fallback implementation
-            response = rag_chain(query)
-        
-        # Handle both string and object responses
-        if hasattr(response, 'content'):
-            return response.content
-        return str(response)
+        return get_document_chain().invoke({"context": docs, "question": query})
     
     except Exception as e:
         logger.error(f"Error in query processing: {e}")
@@ -1,7 +1,14 @@
 import streamlit as st
-import os
-from rag_utils import process_pdf, store_document_embeddings, query_document, get_redis_connection
-import tempfile
+import io
+from rag_utils import (
+    process_pdf,
+    store_document_embeddings,
+    query_document,
+    get_redis_connection,
+    document_digest,
+    status_key,
+    claim_ingest
+)
 
 # Set page config
 st.set_page_config(
@@ -10,6 +17,11 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_cached_redis_connection():
+    """Get a Redis client shared across reruns and sessions"""
+    return get_redis_connection()
+
 # Initialize session state
 if 'current_doc_id' not in st.session_state:
     st.session_state.current_doc_id = None
@@ -27,30 +39,40 @@ and allow you to ask questions about its content.
 uploaded_file = st.file_uploader("Choose a PDF file", type=['pdf'])
 
 if uploaded_file is not None:
-    # Save the uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
-        tmp_path = tmp_file.name
-
     try:
-        # Process the PDF
-        with st.spinner('Processing your document...'):
-            # Extract text and create chunks
-            chunks = process_pdf(tmp_path)
-            if not chunks:
-                st.error("Failed to extract text from the PDF. Please try another file.")
-            else:
-                # Store in Redis
-                redis_client = get_redis_connection()
-                doc_id = f"doc_{uploaded_file.name}"
-                store_document_embeddings(redis_client, doc_id, chunks)
-                st.session_state.current_doc_id = doc_id
-                st.success("Document processed successfully! You can now ask questions about it.")
+        data = uploaded_file.getvalue()
+        redis_client = get_cached_redis_connection()
+        
+        # Identical PDFs share a document ID, so reruns and re-uploads skip re-indexing
+        doc_id = document_digest(data)
+        status = claim_ingest(redis_client, doc_id)
+        if status == 'ready':
+            st.session_state.current_doc_id = doc_id
+            st.success("Document processed successfully! You can now ask questions about it.")
+        elif status == 'processing':
+            st.info("This document is already being processed. Please try again in a moment.")
+        else:
+            # Process the PDF
+            with st.spinner('Processing your document...'):
+                try:
+                    # Extract text and create chunks straight from the uploaded bytes
+                    chunks = process_pdf(io.BytesIO(data))
+                    stored = bool(chunks) and store_document_embeddings(redis_client, doc_id, chunks)
+                except Exception:
+                    redis_client.set(status_key(doc_id), "failed")
+                    raise
+                
+                if not chunks:
+                    redis_client.set(status_key(doc_id), "failed")
+                    st.error("Failed to extract text from the PDF. Please try another file.")
+                elif stored:
+                    st.session_state.current_doc_id = doc_id
+                    st.success("Document processed successfully! You can now ask questions about it.")
+                else:
+                    redis_client.set(status_key(doc_id), "failed")
+                    st.error("Failed to store the document in Redis. Check the server logs for details.")
     except Exception as e:
         st.error(f"Error processing document: {str(e)}")
-    finally:
-        # Clean up temporary file
-        os.unlink(tmp_path)
 
 # Chat interface
 if st.session_state.current_doc_id:
@@ -72,7 +94,7 @@ if st.session_state.current_doc_id:
         try:
             # Get answer from RAG system
             with st.spinner('Thinking...'):
-                redis_client = get_redis_connection()
+                redis_client = get_cached_redis_connection()
                 answer = query_document(redis_client, st.session_state.current_doc_id, prompt)
             
             # Add assistant message to chat history
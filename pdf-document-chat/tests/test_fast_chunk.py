@@ -0,0 +1,42 @@
+from chunking import fast_chunk
+
+
+def sentence(length):
+    """A single sentence of exactly `length` characters"""
+    return "a" * (length - 1) + "."
+
+
+def test_empty_text():
+    assert fast_chunk("", size=1000, overlap=200) == []
+
+
+def test_short_text_is_one_chunk():
+    assert fast_chunk("Hi there. Short.", size=1000, overlap=200) == ["Hi there. Short."]
+
+
+def test_long_sentences_are_not_split():
+    sentences = [sentence(500), sentence(900), sentence(900)]
+    chunks = fast_chunk(" ".join(sentences), size=1000, overlap=200)
+    
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    # Every sentence fits within size, so each one lands whole in some chunk
+    for s in sentences:
+        assert any(s in chunk for chunk in chunks)
+
+
+def test_sentence_longer_than_size_is_hard_split():
+    text = " ".join([sentence(300), sentence(2500), sentence(300)])
+    chunks = fast_chunk(text, size=1000, overlap=200)
+    
+    assert all(0 < len(chunk) <= 1000 for chunk in chunks)
+    assert text.startswith(chunks[0])
+    assert text.endswith(chunks[-1])
+
+
+def test_consecutive_chunks_overlap():
+    text = " ".join(sentence(100) for _ in range(30))
+    chunks = fast_chunk(text, size=1000, overlap=200)
+    
+    assert len(chunks) > 1
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert prev[-100:] in nxt